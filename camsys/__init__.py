@@ -0,0 +1,4 @@
+from .system import CameraSystem
+from .handlers import run_bot, register_command_handlers, register_menu_handlers
+
+__all__ = ["CameraSystem", "run_bot", "register_command_handlers", "register_menu_handlers"]
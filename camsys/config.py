@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+
+# Конфигурационный файл
+CONFIG_FILE = "cam_config.json"
+
+DEFAULT_CONFIG = {
+    "token": "YOUR_BOT_TOKEN",
+    "admin_chat_id": "YOUR_CHAT_ID",
+    "cameras": {},
+    "motion_enabled": True,
+    "cooldown": 30,
+    "threshold": 30000,
+    "check_interval": 5,
+    "timeout": 10,
+    "draw_contours": True,
+    "contour_color": [0, 255, 0],
+    "contour_thickness": 2,
+    "min_contour_area": 1000,
+    "frame_width": 800,
+    "frame_height": 600,
+    "gate_ratio": 0.5
+}
+
+def load_config():
+    """Загрузка конфигурации"""
+    default_config = {**DEFAULT_CONFIG, "cameras": {}}
+
+    try:
+        if os.path.exists(CONFIG_FILE):
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                return {**default_config, **json.load(f)}
+    except Exception as e:
+        print(f"Ошибка загрузки конфига: {e}")
+
+    return default_config
+
+def save_config(config):
+    """Сохранение конфигурации (через временный файл, чтобы не повредить конфиг при сбое)"""
+    tmp_file = None
+    try:
+        # Уникальное имя: фоновая и финальная запись не пишут в один и тот же файл
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(os.path.abspath(CONFIG_FILE)),
+                                         prefix=CONFIG_FILE + ".", suffix=".tmp", delete=False) as f:
+            tmp_file = f.name
+            json.dump(config, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, CONFIG_FILE)
+        return True
+    except Exception as e:
+        print(f"Ошибка сохранения конфига: {e}")
+        if tmp_file is not None and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return False
@@ -0,0 +1,98 @@
+import cv2
+
+
+class Detector:
+    """Общая часть детекторов: состояние каждой камеры хранится в отдельном словаре"""
+
+    def __init__(self, config):
+        self.config = config
+        self.states = {}
+
+    def state(self, cam_id):
+        """Состояние камеры; запрашивается в цикле событий, detect лишь изменяет его"""
+        return self.states.setdefault(cam_id, {})
+
+    def forget(self, cam_id):
+        """Сброс состояния камеры"""
+        self.states.pop(cam_id, None)
+
+
+class DiffDetector(Detector):
+    """Разность соседних кадров: движение, если изменилось больше threshold"""
+
+    def detect(self, gray, state):
+        """Детекция движения; возвращает (есть движение, рамки для отрисовки)"""
+        prev_gray = state.get("prev_frame")
+        state["prev_frame"] = gray
+        if prev_gray is None or prev_gray.shape != gray.shape:
+            return False, []
+
+        diff = cv2.absdiff(prev_gray, gray)
+        _, thresh = cv2.threshold(diff, 25, 255, cv2.THRESH_BINARY)
+        # То же, что np.sum(thresh): пиксели маски равны 0 или 255
+        motion = cv2.countNonZero(thresh) * 255
+        return motion > self.config["threshold"], []
+
+
+class Mog2Detector(Detector):
+    """Модель фона MOG2 на каждую камеру с поиском контуров движения"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.blur_kernel = cv2.getGaussianKernel(21, 0)
+
+    def detect(self, gray, state):
+        """Детекция движения; возвращает (есть движение, рамки для отрисовки)"""
+        # Детекция идёт на уменьшенном кадре шириной не больше frame_width
+        h, w = gray.shape[:2]
+        tw = min(self.config["frame_width"], w)
+        scale = w / tw
+        if tw < w:
+            gray = cv2.resize(gray, (tw, int(h / scale)), interpolation=cv2.INTER_AREA)
+
+        min_area = self.config["min_contour_area"] / (scale * scale)
+
+        # Быстрая проверка: сумма разностей на кадре, уменьшенном в 8 раз.
+        # Порог привязан к минимальной области движения: пятно площадью min_area
+        # с разницей яркости 25 даёт на малом кадре около min_area * 25 / 64,
+        # и gate_ratio < 1 не даёт проверке отсечь то, что нашёл бы полный конвейер.
+        # Сравниваем с последним кадром, который видела модель фона, иначе медленный
+        # дрейф освещения проходит мимо неё и потом срабатывает как движение
+        small = cv2.resize(gray, (0, 0), fx=0.125, fy=0.125, interpolation=cv2.INTER_AREA)
+        prev_small = state.get("prev_small")
+        if prev_small is not None and prev_small.shape == small.shape and "bg" in state:
+            gate = cv2.norm(prev_small, small, cv2.NORM_L1)
+            if gate < self.config["gate_ratio"] * min_area * 25 / 64:
+                return False, []
+        state["prev_small"] = small
+
+        # Размытие 21x21 двумя одномерными проходами с заранее посчитанным ядром
+        cv2.sepFilter2D(gray, -1, self.blur_kernel, self.blur_kernel, dst=gray)
+
+        # Своя модель фона на каждую камеру; первый кадр только инициализирует её
+        if "bg" not in state:
+            state["bg"] = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=16, detectShadows=False)
+            state["bg"].apply(gray)
+            return False, []
+
+        mask = state["bg"].apply(gray)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        motion_detected = False
+        boxes = []
+
+        for contour in contours:
+            if cv2.contourArea(contour) < min_area:
+                continue
+            motion_detected = True
+
+            if self.config["draw_contours"]:
+                x, y, bw, bh = cv2.boundingRect(contour)
+                boxes.append((int(x * scale), int(y * scale), int(bw * scale), int(bh * scale)))
+
+        return motion_detected, boxes
+
+
+DETECTORS = {
+    "diff": DiffDetector,
+    "mog2": Mog2Detector,
+}
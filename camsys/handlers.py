@@ -0,0 +1,370 @@
+import asyncio
+
+import cv2
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler
+
+
+def get_system(context):
+    """CameraSystem, общий для всех обработчиков приложения"""
+    return context.application.bot_data["system"]
+
+def is_admin(update, system):
+    """Команды принимаются только из чата администратора"""
+    return str(update.effective_chat.id) == system.config["admin_chat_id"]
+
+# Тексты ответов (кэшируются в CameraSystem.menu_cache)
+def build_list_text(system):
+    """Текст ответа /list"""
+    if not system.config["cameras"]:
+        return "Нет добавленных камер"
+
+    message = ["Список камер:"]
+    for name, data in system.config["cameras"].items():
+        status = "🟢 Онлайн" if system.camera_status.get(name, False) else "🔴 Оффлайн"
+        auth = " (требуется auth)" if data.get("user") else ""
+        message.append(f"{status} {name}: {data['url']}{auth}")
+    return "\n".join(message)
+
+def build_status_text(system):
+    """Текст ответа /status"""
+    online_cams = sum(system.camera_status.values())
+    total_cams = len(system.config["cameras"])
+
+    status_text = [
+        f"🔹 Детекция движения: {'ВКЛ' if system.config['motion_enabled'] else 'ВЫКЛ'}",
+        f"🔹 Камер: {total_cams} ({online_cams} онлайн)",
+        f"🔹 Порог чувствительности: {system.config['threshold']}",
+        f"🔹 Интервал проверки: {system.config['check_interval']} сек",
+        f"🔹 Таймаут подключения: {system.config['timeout']} сек",
+        f"🔹 Задержка между уведомлениями: {system.config['cooldown']} сек",
+    ]
+    return "Статус системы:\n\n" + "\n".join(status_text)
+
+def build_snapshot_keyboard(system):
+    """Клавиатура выбора камеры для снимка"""
+    buttons = []
+    for cam_id in system.config["cameras"]:
+        status_icon = "🟢" if system.camera_status.get(cam_id, False) else "🔴"
+        buttons.append([InlineKeyboardButton(f"{status_icon} {cam_id}", callback_data=f'snapshot_{cam_id}')])
+    buttons.append([InlineKeyboardButton("🔙 Назад", callback_data='back')])
+    return InlineKeyboardMarkup(buttons)
+
+async def encode_jpeg(frame):
+    """Кодирование кадра в JPEG в памяти"""
+    _, buffer = await asyncio.to_thread(cv2.imencode, '.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return bytes(buffer)
+
+# Общие обработчики
+async def list_cameras(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /list"""
+    system = get_system(context)
+    if not is_admin(update, system):
+        return
+
+    await update.effective_message.reply_text(system.cached_menu("list", build_list_text))
+
+async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /status"""
+    system = get_system(context)
+    if not is_admin(update, system):
+        return
+
+    await update.effective_message.reply_text(system.cached_menu("status", build_status_text))
+
+# Интерфейс на командах (tgalert2-stable)
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /start"""
+    system = get_system(context)
+    if not is_admin(update, system):
+        return
+
+    commands = [
+        "/start - Показать это сообщение",
+        "/add <name> <url> [user] [password] - Добавить камеру",
+        "/remove <name> - Удалить камеру",
+        "/list - Список камер с статусом",
+        "/status - Статус системы",
+        "/motion on|off - Включить/выключить детекцию",
+        "/sensitivity <value> - Установить порог (1000-100000)",
+        "/snapshot <name> - Получить текущий кадр",
+        "/check - Проверить состояние камер"
+    ]
+
+    await update.message.reply_text("📹 Система мониторинга камер\n\n" + "\n".join(commands))
+
+async def snapshot_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /snapshot <name>"""
+    system = get_system(context)
+    if not is_admin(update, system):
+        return
+
+    if not context.args:
+        await update.message.reply_text("Укажите имя камеры: /snapshot <name>")
+        return
+
+    cam_id = context.args[0]
+    if cam_id not in system.config["cameras"]:
+        await update.message.reply_text(f"Камера {cam_id} не найдена")
+        return
+
+    if not system.camera_status.get(cam_id, False):
+        await update.message.reply_text(f"Камера {cam_id} в данный момент оффлайн")
+        return
+
+    frame = await system.get_snapshot(cam_id)
+    if frame is None:
+        await update.message.reply_text("Не удалось получить кадр с камеры")
+        return
+
+    await update.message.reply_photo(await encode_jpeg(frame), caption=f"Кадр с камеры {cam_id}")
+
+async def set_sensitivity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /sensitivity"""
+    system = get_system(context)
+    if not is_admin(update, system):
+        return
+
+    if not context.args:
+        current = system.config["threshold"]
+        await update.message.reply_text(
+            f"Текущая чувствительность: {current}\n"
+            "Используйте: /sensitivity <значение от 1000 до 100000>"
+        )
+        return
+
+    try:
+        new_value = int(context.args[0])
+        if await system.set_sensitivity(new_value):
+            await update.message.reply_text(f"Порог чувствительности изменён на {new_value}")
+        else:
+            await update.message.reply_text("Недопустимое значение! Допустимый диапазон: 1000-100000")
+    except ValueError:
+        await update.message.reply_text("Введите числовое значение!")
+
+async def toggle_motion(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /motion"""
+    system = get_system(context)
+    if not is_admin(update, system):
+        return
+
+    if not context.args:
+        await update.message.reply_text("Используйте: /motion on|off")
+        return
+
+    state = context.args[0].lower()
+    if state in ["on", "off"]:
+        await system.toggle_motion_detection(state == "on")
+        await update.message.reply_text(f"Детекция движения {'включена' if state == 'on' else 'выключена'}")
+    else:
+        await update.message.reply_text("Используйте: /motion on|off")
+
+async def check_cameras(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /check"""
+    system = get_system(context)
+    if not is_admin(update, system):
+        return
+
+    await update.message.reply_text("Проверяем состояние камер...")
+    await system.check_cameras_status()
+    await list_cameras(update, context)
+
+async def add_camera(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /add"""
+    system = get_system(context)
+    if not is_admin(update, system):
+        return
+
+    if len(context.args) < 2:
+        await update.message.reply_text("Использование: /add <имя> <url> [user] [password]")
+        return
+
+    cam_name = context.args[0]
+    cam_url = context.args[1]
+    user = context.args[2] if len(context.args) > 2 else ""
+    password = context.args[3] if len(context.args) > 3 else ""
+
+    is_online = await system.add_camera(cam_name, cam_url, user, password)
+    status = "🟢" if is_online else "🔴"
+    await update.message.reply_text(f"Камера {cam_name} добавлена! Статус: {status}")
+
+async def remove_camera(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /remove"""
+    system = get_system(context)
+    if not is_admin(update, system):
+        return
+
+    if not context.args:
+        await update.message.reply_text("Укажите имя камеры: /remove <name>")
+        return
+
+    cam_id = context.args[0]
+    if system.remove_camera(cam_id):
+        await update.message.reply_text(f"Камера {cam_id} удалена")
+    else:
+        await update.message.reply_text(f"Камера {cam_id} не найдена")
+
+# Интерфейс на кнопках (tgalert3-halfpoop)
+async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, message_id=None):
+    """Главное меню"""
+    system = get_system(context)
+    motion_state = "ВКЛ" if system.config["motion_enabled"] else "ВЫКЛ"
+    buttons = [
+        [InlineKeyboardButton("📷 Список камер", callback_data='list_cams'),
+         InlineKeyboardButton("📊 Статус системы", callback_data='status')],
+        [InlineKeyboardButton(f"🎥 Детекция: {motion_state}", callback_data='toggle_motion'),
+         InlineKeyboardButton("📸 Сделать снимок", callback_data='snapshot_menu')],
+        [InlineKeyboardButton("⚙️ Настройки", callback_data='settings'),
+         InlineKeyboardButton("🔄 Обновить", callback_data='refresh')]
+    ]
+    keyboard = InlineKeyboardMarkup(buttons)
+
+    text = "📹 Главное меню управления камерами"
+    if message_id:
+        await context.bot.edit_message_text(
+            chat_id=update.effective_chat.id,
+            message_id=message_id,
+            text=text,
+            reply_markup=keyboard
+        )
+    else:
+        await update.message.reply_text(text, reply_markup=keyboard)
+
+async def start_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /start"""
+    if not is_admin(update, get_system(context)):
+        return
+    await main_menu(update, context)
+
+async def snapshot_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Меню выбора камеры для снимка"""
+    system = get_system(context)
+    if not is_admin(update, system):
+        return
+
+    keyboard = system.cached_menu("snapshot", build_snapshot_keyboard)
+    text = "Выберите камеру для снимка:"
+    if update.callback_query:
+        await context.bot.edit_message_text(
+            chat_id=update.effective_chat.id,
+            message_id=update.callback_query.message.message_id,
+            text=text,
+            reply_markup=keyboard
+        )
+    else:
+        await update.message.reply_text(text, reply_markup=keyboard)
+
+async def send_snapshot(update: Update, context: ContextTypes.DEFAULT_TYPE, cam_id: str):
+    """Отправка снимка выбранной камеры"""
+    query = update.callback_query
+    await query.answer("Делаем снимок...")
+
+    frame = await get_system(context).get_snapshot(cam_id)
+    if frame is None:
+        await query.edit_message_text("❌ Не удалось получить снимок")
+        return
+
+    try:
+        await context.bot.send_photo(
+            chat_id=update.effective_chat.id,
+            photo=await encode_jpeg(frame),
+            caption=f"📸 Снимок с камеры {cam_id}"
+        )
+    except Exception as e:
+        print(f"Ошибка отправки фото: {e}")
+        await query.edit_message_text("❌ Ошибка отправки снимка")
+
+async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик нажатий на кнопки меню"""
+    system = get_system(context)
+    query = update.callback_query
+    await query.answer()
+    data = query.data
+
+    if not is_admin(update, system):
+        return
+
+    try:
+        if data == 'list_cams':
+            await list_cameras(update, context)
+        elif data == 'status':
+            await status(update, context)
+        elif data == 'toggle_motion':
+            new_state = not system.config["motion_enabled"]
+            await system.toggle_motion_detection(new_state)
+            await main_menu(update, context, query.message.message_id)
+        elif data == 'snapshot_menu':
+            await snapshot_menu(update, context)
+        elif data == 'settings':
+            await query.edit_message_text("⚙️ Настройки пока недоступны")
+        elif data == 'refresh':
+            await system.check_cameras_status()
+            await main_menu(update, context, query.message.message_id)
+        elif data.startswith('snapshot_'):
+            cam_id = data[len('snapshot_'):]
+            await send_snapshot(update, context, cam_id)
+        elif data == 'back':
+            await main_menu(update, context, query.message.message_id)
+    except Exception as e:
+        print(f"Ошибка обработки callback: {e}")
+        await query.edit_message_text("⚠️ Произошла ошибка, попробуйте позже")
+
+def register_command_handlers(app):
+    """Команды /add, /remove, /snapshot <name> и т.д."""
+    app.add_handler(CommandHandler("start", help_command))
+    app.add_handler(CommandHandler("add", add_camera))
+    app.add_handler(CommandHandler("remove", remove_camera))
+    app.add_handler(CommandHandler("list", list_cameras))
+    app.add_handler(CommandHandler("status", status))
+    app.add_handler(CommandHandler("snapshot", snapshot_command))
+    app.add_handler(CommandHandler("sensitivity", set_sensitivity))
+    app.add_handler(CommandHandler("motion", toggle_motion))
+    app.add_handler(CommandHandler("check", check_cameras))
+
+def register_menu_handlers(app):
+    """Меню на inline-кнопках"""
+    app.add_handler(CommandHandler("start", start_menu))
+    app.add_handler(CallbackQueryHandler(button_handler))
+    app.add_handler(CommandHandler("list", list_cameras))
+    app.add_handler(CommandHandler("status", status))
+    app.add_handler(CommandHandler("snapshot", snapshot_menu))
+
+async def run_bot(system, register_handlers):
+    """Запуск бота и фоновых задач мониторинга"""
+    try:
+        await system.init_bot()
+    except Exception as e:
+        print(f"Fail to init bot: {e}")
+        return
+
+    app = Application.builder().token(system.config["token"]).build()
+    app.bot_data["system"] = system
+    register_handlers(app)
+
+    # Запуск фоновых задач
+    asyncio.create_task(system.check_motion())
+    system.flush_task = asyncio.create_task(system.flush_config())
+
+    print("Бот запущен!")
+    print(f"Admin chat ID: {system.config['admin_chat_id']}")
+
+    try:
+        await app.initialize()
+        await app.start()
+        await app.updater.start_polling()
+
+        # Бесконечный цикл ожидания
+        while True:
+            await asyncio.sleep(3600)
+
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        print(f"Err in main loop: {e}")
+    finally:
+        if app.updater.running:
+            await app.updater.stop()
+        if app.running:
+            await app.stop()
+        await app.shutdown()
+        await system.cleanup()
@@ -0,0 +1,456 @@
+import asyncio
+import copy
+import hashlib
+import threading
+import time
+from functools import partial
+from urllib.parse import urlparse
+
+import cv2
+import httpx
+import numpy as np
+from telegram import Bot
+
+from .config import load_config, save_config
+from .cv_pipeline import DETECTORS
+
+
+def make_auth(cam_data):
+    """Basic-авторизация камеры (заголовок кодируется один раз)"""
+    return httpx.BasicAuth(cam_data.get("user", ""), cam_data.get("password", ""))
+
+
+class CameraSystem:
+    def __init__(self, mode="mog2"):
+        self.config = load_config()
+        self.detector = DETECTORS[mode](self.config)
+        self.bot = None
+        self.http = None
+        self.auth = {cam_id: make_auth(cam_data) for cam_id, cam_data in self.config["cameras"].items()}
+        self.camera_status = {}
+        self.last_notification = {}
+        self.config_dirty = asyncio.Event()
+        self.flush_task = None
+        self.menu_cache = {}
+        self.mjpeg_pumps = {}
+        self.latest_frames = {}
+        self.last_seq = {}
+        self.frame_lock = threading.Lock()
+        self.lock = asyncio.Lock()
+        self.last_hash = {}
+        self.jpeg_buffers = {}
+        self.polled_ok = set()
+
+    async def init_bot(self):
+        """Инициализация бота"""
+        try:
+            self.bot = Bot(token=self.config["token"])
+            await self.bot.get_me()  # Проверка подключения
+            # Общий клиент с пулом соединений для всех камер
+            self.http = httpx.AsyncClient(
+                # Короткий таймаут на подключение: недоступная камера не задерживает общую проверку
+                timeout=httpx.Timeout(connect=1.5, read=self.config["timeout"], write=2.0, pool=2.0),
+                limits=httpx.Limits(
+                    max_keepalive_connections=32,
+                    max_connections=64,
+                    keepalive_expiry=60
+                )
+            )
+            print("Бот инициализирован")
+        except Exception as e:
+            print(f"Ошибка инициализации бота: {e}")
+            raise
+
+    async def check_camera(self, cam_id, cam_data):
+        """Проверка доступности одной камеры"""
+        # Многие камеры не поддерживают HEAD, поэтому запрашиваем первый байт через GET
+        try:
+            async with self.http.stream(
+                "GET",
+                cam_data["url"],
+                headers={"Range": "bytes=0-0"},
+                auth=self.auth[cam_id]
+            ) as response:
+                # Тело дочитываем, чтобы соединение вернулось в пул: один байт при 206
+                # или целый снимок, если камера проигнорировала Range
+                if response.status_code == 206 or (response.status_code == 200 and not self.is_mjpeg_url(cam_data["url"])):
+                    await response.aread()
+                    return True
+                # MJPEG-поток бесконечен: тело не читаем, соединение закрывается
+                return response.status_code == 200
+        except Exception:
+            return False
+
+    async def check_cameras_status(self):
+        """Проверка состояния всех камер"""
+        async with self.lock:
+            cameras = list(self.config["cameras"].items())
+            # Камеры, успешно опрошенные в прошлом цикле, заведомо онлайн: повторный запрос не нужен
+            polled_ok, self.polled_ok = self.polled_ok, set()
+            probed = [(cam_id, cam_data) for cam_id, cam_data in cameras if cam_id not in polled_ok]
+            probe_results = await asyncio.gather(
+                *(self.check_camera(cam_id, cam_data) for cam_id, cam_data in probed)
+            )
+            online = dict(zip((cam_id for cam_id, _ in probed), probe_results))
+            results = [online.get(cam_id, True) for cam_id, _ in cameras]
+            # Пока шла проверка, камеру могли удалить или заменить: её результат уже не актуален
+            new_status = {
+                cam_id: is_online
+                for (cam_id, cam_data), is_online in zip(cameras, results)
+                if self.is_current(cam_id, cam_data)
+            }
+            if any(self.camera_status.get(cam_id) != is_online for cam_id, is_online in new_status.items()):
+                self.invalidate_menus()
+            self.camera_status.update(new_status)
+
+    def is_current(self, cam_id, cam_data):
+        """Камеру не удалили и не заменили, пока шёл опрос"""
+        # После каждого await состояние камеры записывается только при этой проверке
+        return self.config["cameras"].get(cam_id) is cam_data
+
+    async def process_camera(self, cam_id, cam_data):
+        """Цветной кадр с камеры (для снимков)"""
+        try:
+            if self.is_mjpeg_url(cam_data["url"]):
+                _, frame = await self.process_mjpeg_camera(cam_id, cam_data)
+                return frame
+            else:
+                return await self.process_jpeg_camera(cam_id, cam_data)
+        except Exception as e:
+            print(f"Ошибка обработки камеры {cam_id}: {e}")
+            return None
+
+    async def grab_gray_frame(self, cam_id, cam_data):
+        """Серый кадр для детекции и функция, декодирующая цветной кадр для уведомления"""
+        try:
+            if self.is_mjpeg_url(cam_data["url"]):
+                seq, frame = await self.process_mjpeg_camera(cam_id, cam_data)
+                # Новый кадр из потока ещё не пришёл
+                if frame is None or not self.is_current(cam_id, cam_data) or self.last_seq.get(cam_id) == seq:
+                    return None, None
+                self.last_seq[cam_id] = seq
+                self.polled_ok.add(cam_id)
+                gray = await asyncio.to_thread(cv2.cvtColor, frame, cv2.COLOR_BGR2GRAY)
+                return gray, lambda: frame
+
+            content = await self.read_jpeg_into_buffer(cam_id, cam_data)
+            if content is None or not self.is_current(cam_id, cam_data):
+                return None, None
+            self.polled_ok.add(cam_id)
+            # Камера отдала те же байты, что и в прошлый раз: сцена статична, движения нет
+            frame_hash = hashlib.blake2b(content, digest_size=8).digest()
+            if self.last_hash.get(cam_id) == frame_hash:
+                return None, None
+            self.last_hash[cam_id] = frame_hash
+
+            buffer = np.frombuffer(content, np.uint8)
+            gray = await asyncio.to_thread(cv2.imdecode, buffer, cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                return None, None
+            return gray, partial(cv2.imdecode, buffer, cv2.IMREAD_COLOR)
+        except Exception as e:
+            print(f"Ошибка обработки камеры {cam_id}: {e}")
+            return None, None
+
+    async def fetch_jpeg(self, cam_id, cam_data):
+        """Загрузка JPEG-кадра"""
+        try:
+            response = await self.http.get(
+                cam_data["url"],
+                auth=self.auth[cam_id]
+            )
+            if response.status_code == 200:
+                return response.content
+        except Exception as e:
+            print(f"Ошибка JPEG камеры: {e}")
+        return None
+
+    async def read_jpeg_into_buffer(self, cam_id, cam_data):
+        """Загрузка JPEG-кадра в переиспользуемый буфер камеры"""
+        # Буфер перезаписывается на следующем опросе, поэтому он нужен только внутри _tick
+        buffer = self.jpeg_buffers.get(cam_id)
+        if buffer is None:
+            buffer = bytearray(2 * 1024 * 1024)
+
+        size = 0
+        try:
+            async with self.http.stream("GET", cam_data["url"], auth=self.auth[cam_id]) as response:
+                if response.status_code != 200:
+                    return None
+                async for chunk in response.aiter_bytes():
+                    end = size + len(chunk)
+                    if end > len(buffer):
+                        grown = bytearray(max(end, 2 * len(buffer)))
+                        grown[:size] = buffer[:size]
+                        buffer = grown
+                    buffer[size:end] = chunk
+                    size = end
+        except Exception as e:
+            print(f"Ошибка JPEG камеры: {e}")
+            return None
+        if self.is_current(cam_id, cam_data):
+            self.jpeg_buffers[cam_id] = buffer
+        return memoryview(buffer)[:size]
+
+    async def process_jpeg_camera(self, cam_id, cam_data):
+        """Цветной кадр с JPEG-камеры"""
+        content = await self.fetch_jpeg(cam_id, cam_data)
+        if content is None:
+            return None
+        buffer = np.frombuffer(content, np.uint8)
+        return await asyncio.to_thread(cv2.imdecode, buffer, cv2.IMREAD_COLOR)
+
+    async def process_mjpeg_camera(self, cam_id, cam_data):
+        """Последний кадр MJPEG-потока: (номер кадра, кадр)"""
+        # Поток читается в отдельном треде, здесь берём только последний кадр
+        url = cam_data["url"]
+        pump, stop, pump_url = self.mjpeg_pumps.get(cam_id, (None, None, None))
+        if pump is None or not pump.is_alive() or pump_url != url:
+            # Поток со старым адресом может ещё спать или висеть в VideoCapture,
+            # поэтому не ждём его, а останавливаем и сразу запускаем новый
+            if stop is not None:
+                stop.set()
+            stop = threading.Event()
+            pump = threading.Thread(target=self._mjpeg_pump, args=(cam_id, url, stop), daemon=True)
+            self.mjpeg_pumps[cam_id] = (pump, stop, url)
+            pump.start()
+
+            # Даём только что запущенному потоку время на первый кадр
+            deadline = time.monotonic() + self.config["timeout"]
+            while cam_id not in self.latest_frames and pump.is_alive() and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+
+        with self.frame_lock:
+            return self.latest_frames.get(cam_id, (0, None))
+
+    def _pump_active(self, cam_id, url, stop):
+        # Поток останавливается при выключении, удалении камеры или смене её адреса
+        return not stop.is_set() and self.config["cameras"].get(cam_id, {}).get("url") == url
+
+    def _mjpeg_pump(self, cam_id, url, stop):
+        delay = 1
+        while self._pump_active(cam_id, url, stop):
+            stream = cv2.VideoCapture(url)
+            try:
+                while self._pump_active(cam_id, url, stop) and stream.isOpened():
+                    if not stream.grab():
+                        break
+                    ret, frame = stream.retrieve()
+                    if not ret:
+                        break
+                    with self.frame_lock:
+                        # Проверка под блокировкой: после forget_camera кадр старого потока не записывается
+                        if not self._pump_active(cam_id, url, stop):
+                            break
+                        seq = self.latest_frames.get(cam_id, (0, None))[0] + 1
+                        self.latest_frames[cam_id] = (seq, frame)
+                    delay = 1
+            except Exception as e:
+                print(f"Ошибка MJPEG потока {cam_id}: {e}")
+            finally:
+                stream.release()
+
+            # Переподключение с экспоненциальной задержкой
+            stop.wait(delay)
+            delay = min(delay * 2, 60)
+
+    def is_mjpeg_url(self, url):
+        parsed = urlparse(url)
+        return 'mjpg' in parsed.path.lower() or 'mjpeg' in parsed.path.lower()
+
+    async def check_motion(self):
+        """Основной цикл проверки движения"""
+        while True:
+            await self.check_cameras_status()
+
+            if self.config["motion_enabled"]:
+                cameras = [
+                    cam_id for cam_id in self.config["cameras"]
+                    if self.camera_status.get(cam_id, False)
+                ]
+                # Ошибка на одной камере не должна останавливать мониторинг остальных
+                results = await asyncio.gather(
+                    *(self._tick(cam_id, self.config["cameras"][cam_id]) for cam_id in cameras),
+                    return_exceptions=True
+                )
+                for cam_id, result in zip(cameras, results):
+                    if isinstance(result, Exception):
+                        print(f"Ошибка обработки камеры {cam_id}: {result}")
+
+            await asyncio.sleep(self.config["check_interval"])
+
+    async def _tick(self, cam_id, cam_data):
+        """Один цикл опроса камеры"""
+        # Камеру могли удалить или заменить, пока задача ждала запуска
+        if not self.is_current(cam_id, cam_data):
+            return
+        gray, to_color = await self.grab_gray_frame(cam_id, cam_data)
+        if gray is None or not self.is_current(cam_id, cam_data):
+            return
+        # Состояние детектора берётся здесь, в цикле событий: после forget_camera
+        # поток изменит уже отвязанный словарь, а не состояние новой камеры
+        state = self.detector.state(cam_id)
+        # OpenCV отпускает GIL, поэтому кадры разных камер обрабатываются параллельно
+        motion_detected, boxes = await asyncio.to_thread(self.calculate_motion, gray, state)
+        # Цветной кадр нужен только если уведомление действительно уйдёт
+        if motion_detected and self.is_current(cam_id, cam_data) and self.alert_allowed(cam_id):
+            frame = await asyncio.to_thread(to_color)
+            if frame is not None and self.is_current(cam_id, cam_data):
+                await self.send_alert(cam_id, cam_data, self.draw_motion(frame, boxes))
+
+    def calculate_motion(self, gray, state):
+        """Детекция движения выбранным детектором"""
+        try:
+            return self.detector.detect(gray, state)
+        except Exception as e:
+            print(f"Ошибка детекции движения: {e}")
+            return False, []
+
+    def draw_motion(self, frame, boxes):
+        """Отрисовка рамок движения на цветном кадре"""
+        # Копия нужна только если есть что рисовать: кадр MJPEG-потока общий со снимками
+        if not self.config["draw_contours"] or not boxes:
+            return frame
+        processed_frame = frame.copy()
+        for x, y, w, h in boxes:
+            cv2.rectangle(processed_frame, (x, y), (x+w, y+h),
+                        self.config["contour_color"],
+                        self.config["contour_thickness"])
+        return processed_frame
+
+    def alert_allowed(self, cam_id):
+        """Прошла ли задержка между уведомлениями для камеры"""
+        last = self.last_notification.get(cam_id)
+        return last is None or time.monotonic() - last >= self.config["cooldown"]
+
+    async def send_alert(self, cam_id, cam_data, frame):
+        """Отправка уведомления"""
+        if not self.alert_allowed(cam_id):
+            return
+
+        try:
+            _, buffer = await asyncio.to_thread(cv2.imencode, '.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            await self.bot.send_photo(
+                chat_id=self.config["admin_chat_id"],
+                photo=bytes(buffer),
+                caption=f"⚠️ Движение на камере {cam_id} ({time.strftime('%Y-%m-%d %H:%M:%S')})"
+            )
+            if self.is_current(cam_id, cam_data):
+                self.last_notification[cam_id] = time.monotonic()
+        except Exception as e:
+            print(f"Ошибка отправки уведомления: {e}")
+
+    def save_config(self):
+        """Отложенное сохранение конфигурации"""
+        self.invalidate_menus()
+        self.config_dirty.set()
+
+    def invalidate_menus(self):
+        """Сброс закэшированных ответов меню"""
+        self.menu_cache.clear()
+
+    def cached_menu(self, key, build):
+        """Ответ из кэша; пересобирается только после изменения конфига или статуса камер"""
+        if key not in self.menu_cache:
+            self.menu_cache[key] = build(self)
+        return self.menu_cache[key]
+
+    async def flush_config(self):
+        """Фоновая запись конфигурации не чаще раза в 2 секунды"""
+        while True:
+            await self.config_dirty.wait()
+            await asyncio.sleep(2)
+            self.config_dirty.clear()
+            save = asyncio.ensure_future(asyncio.to_thread(save_config, copy.deepcopy(self.config)))
+            try:
+                saved = await asyncio.shield(save)
+            except asyncio.CancelledError:
+                # Начатую запись дожидаемся, чтобы она не перезаписала финальную из cleanup
+                await save
+                raise
+            # Неудачную запись повторим на следующем проходе
+            if not saved:
+                self.config_dirty.set()
+
+    async def cleanup(self):
+        """Освобождение ресурсов"""
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+            self.flush_task = None
+        if self.config_dirty.is_set():
+            self.config_dirty.clear()
+            save_config(self.config)
+        for _, stop, _ in self.mjpeg_pumps.values():
+            stop.set()
+        for pump, _, _ in self.mjpeg_pumps.values():
+            await asyncio.to_thread(pump.join, 1)
+        self.mjpeg_pumps.clear()
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+    async def get_snapshot(self, cam_id):
+        """Получение снимка с камеры"""
+        if cam_id not in self.config["cameras"]:
+            return None
+        return await self.process_camera(cam_id, self.config["cameras"][cam_id])
+
+    async def add_camera(self, cam_id, url, user="", password=""):
+        """Добавление камеры; возвращает её статус"""
+        self.forget_camera(cam_id)
+        self.config["cameras"][cam_id] = {
+            "url": url,
+            "user": user,
+            "password": password
+        }
+        self.auth[cam_id] = make_auth(self.config["cameras"][cam_id])
+        self.save_config()
+
+        is_online = await self.check_camera(cam_id, self.config["cameras"][cam_id])
+        self.camera_status[cam_id] = is_online
+        self.invalidate_menus()
+        return is_online
+
+    def remove_camera(self, cam_id):
+        """Удаление камеры"""
+        if cam_id not in self.config["cameras"]:
+            return False
+        del self.config["cameras"][cam_id]
+        self.forget_camera(cam_id)
+        self.save_config()
+        return True
+
+    def forget_camera(self, cam_id):
+        """Сброс накопленного состояния камеры"""
+        self.auth.pop(cam_id, None)
+        self.camera_status.pop(cam_id, None)
+        self.last_notification.pop(cam_id, None)
+        self.last_hash.pop(cam_id, None)
+        self.last_seq.pop(cam_id, None)
+        self.jpeg_buffers.pop(cam_id, None)
+        self.polled_ok.discard(cam_id)
+        pump = self.mjpeg_pumps.pop(cam_id, None)
+        if pump is not None:
+            pump[1].set()
+        with self.frame_lock:
+            self.latest_frames.pop(cam_id, None)
+        self.detector.forget(cam_id)
+
+    async def set_sensitivity(self, threshold):
+        """Установка порога чувствительности"""
+        try:
+            threshold = int(threshold)
+            if 1000 <= threshold <= 100000:
+                self.config["threshold"] = threshold
+                self.save_config()
+                return True
+            return False
+        except ValueError:
+            return False
+
+    async def toggle_motion_detection(self, state):
+        """Переключение детекции движения"""
+        self.config["motion_enabled"] = state
+        self.save_config()
+        return True